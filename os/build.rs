@@ -178,11 +178,11 @@ fn get_latest_mtime(path: &Path) -> Option<std::time::SystemTime> {
 
 /// 创建空的 simple_fs 镜像
 fn create_empty_image(path: &PathBuf) {
-    // 空镜像格式: RAMDISK\0 + 0个文件 + 保留字段
+    // 空镜像格式: RAMDISK\0 + 0个文件 + 格式版本
     let empty_header: [u8; 16] = [
         b'R', b'A', b'M', b'D', b'I', b'S', b'K', 0, // 魔数
         0, 0, 0, 0, // 文件数量 = 0
-        0, 0, 0, 0, // 保留
+        1, 0, 0, 0, // 格式版本 = 1 (与 SimpleFs 的 SIMPLE_FS_VERSION 一致)
     ];
 
     if let Err(e) = fs::write(path, empty_header) {
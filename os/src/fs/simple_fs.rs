@@ -8,15 +8,19 @@
 //!
 //! ```text
 //! +------------------+
-//! | Header (512B)    |  Magic: "RAMDISK\0", File count
+//! | Header (16B)     |  Magic: "RAMDISK\0", File count, Version
 //! +------------------+
-//! | File Entry 1     |  Header (32B) + Name + Data
+//! | Entry Table      |  N x 32B: Magic, name_len, data_len, type, mode,
+//! |                  |           name_offset, data_offset, reserved
 //! +------------------+
-//! | File Entry 2     |
-//! | ...              |
+//! | Names            |  UTF-8, each 4-byte aligned
+//! +------------------+
+//! | Data (512B algn) |  File payloads, each 512-byte aligned
 //! +------------------+
 //! ```
 //!
+//! `name_offset` / `data_offset` 为相对镜像起始位置的字节偏移。
+//!
 //! ## 加载流程
 //!
 //! 1. 编译时 `build.rs` 生成镜像并嵌入
@@ -57,6 +61,11 @@ use alloc::vec;
 use alloc::vec::Vec;
 use core::sync::atomic::{AtomicU64, Ordering};
 
+/// 镜像格式版本（镜像头第 12..16 字节）
+///
+/// 版本 1 为条目表 + 名称区 + 数据区的布局；旧的交错布局镜像此处为 0。
+pub const SIMPLE_FS_VERSION: u32 = 1;
+
 /// 简单的内存文件系统（用于测试）
 pub struct SimpleFs {
     device: Option<Arc<dyn BlockDriver>>, // 可选的块设备
@@ -122,6 +131,10 @@ impl SimpleFs {
         }
 
         let file_count = u32::from_le_bytes(header_block[8..12].try_into().unwrap());
+        let version = u32::from_le_bytes(header_block[12..16].try_into().unwrap());
+        if version != SIMPLE_FS_VERSION {
+            return Err(FsError::IoError);
+        }
 
         // 2. 创建根目录 inode (0o755 = rwxr-xr-x)
         let root = Arc::new(SimpleFsInode::new_dir(
@@ -135,10 +148,9 @@ impl SimpleFs {
                 | FileMode::S_IXOTH,
         ));
 
-        // 3. 解析镜像，填充文件树
-        let mut offset = 16;
-        for _ in 0..file_count {
-            offset = Self::parse_file_entry(device.clone(), offset, root.clone())?;
+        // 3. 解析条目表，填充文件树
+        for i in 0..file_count as usize {
+            Self::parse_file_entry(device.clone(), 16 + i * 32, root.clone())?;
         }
 
         Ok(Self {
@@ -147,13 +159,13 @@ impl SimpleFs {
         })
     }
 
-    /// 解析镜像中的单个文件条目并添加到父目录
+    /// 解析条目表中的单个文件条目并添加到父目录
     fn parse_file_entry(
         device: Arc<dyn BlockDriver>,
         offset: usize,
         parent: Arc<SimpleFsInode>,
-    ) -> Result<usize, FsError> {
-        // 读取文件头 (32字节)
+    ) -> Result<(), FsError> {
+        // 读取条目 (32字节)
         let mut header_buf = vec![0u8; 32];
         Self::read_at_offset(device.clone(), offset, &mut header_buf)?;
 
@@ -166,23 +178,19 @@ impl SimpleFs {
         let data_len = u32::from_le_bytes(header_buf[8..12].try_into().unwrap()) as usize;
         let file_type = u32::from_le_bytes(header_buf[12..16].try_into().unwrap());
         let mode = u32::from_le_bytes(header_buf[16..20].try_into().unwrap());
-
-        let mut cur_offset = offset + 32;
+        let name_offset = u32::from_le_bytes(header_buf[20..24].try_into().unwrap()) as usize;
+        let data_offset = u32::from_le_bytes(header_buf[24..28].try_into().unwrap()) as usize;
 
         // 读取文件名
-        let name_aligned = name_len.div_ceil(4) * 4;
-        let mut name_buf = vec![0u8; name_aligned];
-        Self::read_at_offset(device.clone(), cur_offset, &mut name_buf)?;
-        let name = String::from(String::from_utf8_lossy(&name_buf[..name_len]));
-        cur_offset += name_aligned;
+        let mut name_buf = vec![0u8; name_len];
+        Self::read_at_offset(device.clone(), name_offset, &mut name_buf)?;
+        let name = String::from(String::from_utf8_lossy(&name_buf));
 
         // 读取文件数据
-        let data_aligned = data_len.div_ceil(512) * 512;
         let mut data_buf = vec![0u8; data_len];
         if data_len > 0 {
-            Self::read_at_offset(device.clone(), cur_offset, &mut data_buf)?;
+            Self::read_at_offset(device.clone(), data_offset, &mut data_buf)?;
         }
-        cur_offset += data_aligned;
 
         // 创建 inode 并添加到父目录
         let inode = if file_type == 0 {
@@ -200,7 +208,7 @@ impl SimpleFs {
         // 处理多级路径 (如 "bin/hello")
         Self::insert_inode_by_path(&name, inode, parent)?;
 
-        Ok(cur_offset)
+        Ok(())
     }
 
     /// 从设备的任意偏移位置读取数据（支持跨块读取）
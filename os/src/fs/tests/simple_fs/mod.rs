@@ -1,5 +1,5 @@
 use crate::device::block::ram_disk::RamDisk;
-use crate::fs::simple_fs::SimpleFs;
+use crate::fs::simple_fs::{SIMPLE_FS_VERSION, SimpleFs};
 use crate::vfs::error::FsError;
 use crate::vfs::file_system::FileSystem;
 use crate::vfs::inode::{FileMode, Inode, InodeType};
@@ -15,7 +15,7 @@ pub fn create_test_simplefs() -> Arc<SimpleFs> {
 /// 创建一个包含测试文件的 RamDisk
 pub fn create_test_ramdisk_with_files() -> Arc<RamDisk> {
     // 创建一个简单的 RamDisk 镜像格式:
-    // Header: "RAMDISK\0" (8 bytes) + file_count (4 bytes)
+    // Header: "RAMDISK\0" (8 bytes) + file_count (4 bytes) + version (4 bytes)
     // 为了测试,我们创建一个空的 ramdisk
     let mut data = alloc::vec![];
 
@@ -25,6 +25,9 @@ pub fn create_test_ramdisk_with_files() -> Arc<RamDisk> {
     // File count: 0 (little-endian)
     data.extend_from_slice(&0u32.to_le_bytes());
 
+    // Format version
+    data.extend_from_slice(&SIMPLE_FS_VERSION.to_le_bytes());
+
     // Pad to block size (512 bytes)
     data.resize(512, 0);
 
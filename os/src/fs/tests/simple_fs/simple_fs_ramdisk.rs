@@ -1,6 +1,7 @@
 use super::*;
 use crate::device::block::BlockDriver;
-use crate::fs::simple_fs::SimpleFs;
+use crate::fs::simple_fs::{SIMPLE_FS_VERSION, SimpleFs};
+use crate::vfs::file_system::FileSystem;
 use crate::{kassert, test_case};
 use alloc::vec;
 
@@ -33,6 +34,8 @@ test_case!(test_simplefs_ramdisk_file_count, {
     data[0..8].copy_from_slice(b"RAMDISK\0");
     // File count: 0
     data[8..12].copy_from_slice(&0u32.to_le_bytes());
+    // Format version
+    data[12..16].copy_from_slice(&SIMPLE_FS_VERSION.to_le_bytes());
 
     let ramdisk = RamDisk::from_bytes(data, 512, 0);
 
@@ -41,6 +44,71 @@ test_case!(test_simplefs_ramdisk_file_count, {
     kassert!(result.is_ok());
 });
 
+test_case!(test_simplefs_ramdisk_version_mismatch, {
+    // 旧的交错布局镜像版本字段为 0，应被拒绝
+    let mut data = alloc::vec![0u8; 512];
+    data[0..8].copy_from_slice(b"RAMDISK\0");
+    data[8..12].copy_from_slice(&1u32.to_le_bytes());
+
+    let ramdisk = RamDisk::from_bytes(data, 512, 0);
+
+    let result = SimpleFs::from_ramdisk(ramdisk);
+    kassert!(matches!(result, Err(FsError::IoError)));
+});
+
+test_case!(test_simplefs_ramdisk_parse_entries, {
+    // 构造包含一个目录和一个文件的镜像：
+    // [镜像头 16B][条目表 2 x 32B][名称区 @80][数据区 @512]
+    let content = b"Hello, SimpleFS!";
+    let mut data = alloc::vec![0u8; 1024];
+    data[0..8].copy_from_slice(b"RAMDISK\0");
+    data[8..12].copy_from_slice(&2u32.to_le_bytes());
+    data[12..16].copy_from_slice(&SIMPLE_FS_VERSION.to_le_bytes());
+
+    // 条目: 魔数, 名称长度, 数据长度, 类型, 权限, 名称偏移, 数据偏移, 保留
+    let entries: [[u32; 8]; 2] = [
+        [0x46494C45, 3, 0, 1, 0o755, 80, 512, 0],
+        [0x46494C45, 9, content.len() as u32, 0, 0o644, 84, 512, 0],
+    ];
+    for (i, entry) in entries.iter().enumerate() {
+        for (j, field) in entry.iter().enumerate() {
+            let offset = 16 + i * 32 + j * 4;
+            data[offset..offset + 4].copy_from_slice(&field.to_le_bytes());
+        }
+    }
+
+    // 名称区: "bin" 补齐到 4 字节，"bin/hello" 补齐到 12 字节
+    data[80..83].copy_from_slice(b"bin");
+    data[84..93].copy_from_slice(b"bin/hello");
+
+    // 数据区从块边界开始
+    data[512..512 + content.len()].copy_from_slice(content);
+
+    let ramdisk = RamDisk::from_bytes(data, 512, 0);
+    let result = SimpleFs::from_ramdisk(ramdisk);
+    kassert!(result.is_ok());
+    let fs = result.unwrap();
+
+    // 验证目录
+    let bin = fs.root_inode().lookup("bin");
+    kassert!(bin.is_ok());
+    let bin = bin.unwrap();
+    kassert!(bin.metadata().unwrap().inode_type == InodeType::Directory);
+
+    // 验证文件及其内容
+    let hello = bin.lookup("hello");
+    kassert!(hello.is_ok());
+    let hello = hello.unwrap();
+    let metadata = hello.metadata().unwrap();
+    kassert!(metadata.inode_type == InodeType::File);
+    kassert!(metadata.size == content.len());
+
+    let mut buf = vec![0u8; content.len()];
+    let bytes_read = hello.read_at(0, &mut buf).unwrap();
+    kassert!(bytes_read == content.len());
+    kassert!(&buf[..] == content);
+});
+
 // P1 重要功能测试
 
 test_case!(test_simplefs_ramdisk_block_size, {
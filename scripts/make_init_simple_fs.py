@@ -5,92 +5,274 @@ Simple_fs 镜像打包工具
 将用户程序打包成简单的块设备镜像格式，供 RamDisk + SimpleFS 使用。
 
 镜像格式：
-- 镜像头: "RAMDISK\0" (8字节) + 文件数量 (4字节) + 保留 (4字节)
-- 文件头: 魔数 (4) + 名称长度 (4) + 数据长度 (4) + 文件类型 (4) + 权限 (4) + padding (12)
-- 文件名: UTF-8 编码，4字节对齐
-- 文件数据: 原始数据，512字节对齐
+- 镜像头: "RAMDISK\0" (8字节) + 文件数量 (4字节) + 格式版本 (4字节)
+- 条目表: 每个条目 32 字节，魔数 (4) + 名称长度 (4) + 数据长度 (4) + 文件类型 (4)
+  + 权限 (4) + 名称偏移 (4) + 数据偏移 (4) + 保留 (4)
+- 名称区: 紧随条目表，依次存放所有文件名，UTF-8 编码，各自4字节对齐
+- 数据区: 从块边界开始，依次存放所有文件数据，各自512字节对齐
+
+偏移均为相对于镜像起始位置的字节偏移。
 """
 
+import mmap
+import os
 import struct
 import sys
 import argparse
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
 from pathlib import Path
-from typing import List, Tuple
+from operator import attrgetter
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
 
 # 常量定义
 MAGIC = b"RAMDISK\0"
+# 镜像格式版本：1 为条目表 + 名称区 + 数据区的布局（旧的交错布局此处为 0）
+FORMAT_VERSION = 1
 FILE_MAGIC = 0x46494C45  # "FILE"
 BLOCK_SIZE = 512
 
+# 共享的零填充缓冲区，切片为视图，所有填充（均小于一个块）都从中取用
+ZEROS = memoryview(bytes(BLOCK_SIZE))
+
+# 由线程池预读的文件大小上限，更大的文件在写入时流式复制
+PREFETCH_LIMIT = 64 * 1024
+# 每批提交给线程池的条目数，限制预读数据占用的内存
+PREFETCH_BATCH = 256
+
+# 镜像文件的写缓冲区大小，合并小文件数据和填充的写入
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Linux 上使用 sendfile 在内核中直接复制文件数据
+USE_SENDFILE = hasattr(os, 'sendfile') and sys.platform.startswith('linux')
+
+# 镜像头 (16字节): 魔数 + 文件数量 + 格式版本
+IMG_HDR = struct.Struct('<8sII')
+# 条目 (32字节): 魔数 + 名称长度 + 数据长度 + 文件类型 + 权限 + 名称偏移 + 数据偏移 + 保留
+FILE_HDR = struct.Struct('<8I')
+
 # 文件类型
 FILE_TYPE_FILE = 0
 FILE_TYPE_DIR = 1
 
+# 遍历时整体跳过的目录（构建产物、版本库元数据等）
+PRUNE_DIRS = frozenset({'target', '.git', '__pycache__', 'node_modules', '.cargo'})
+
+# 收集文件时跳过的文件后缀和文件名
+SKIP_SUFFIXES = frozenset({'.d', '.o', '.a', '.rlib', '.rmeta'})
+SKIP_NAMES = frozenset({'Cargo.lock', '.gitignore'})
+
+# 打包时跳过的特殊文件名（对文件和目录均生效）
+EXCLUDED_NAMES = frozenset({'Cargo.lock', 'Cargo.toml'})
+
+# (目录项, 是否为目录)
+Entry = Tuple[os.DirEntry, bool]
+
+
+class EntryMeta(NamedTuple):
+    """写入条目表所需的单个条目元数据"""
+    name: bytes      # 相对路径，UTF-8 编码
+    file_type: int   # FILE_TYPE_FILE / FILE_TYPE_DIR
+    mode: int        # 权限
+    size: int        # 数据长度，目录为 0
+
 
 def align_to(size: int, alignment: int) -> int:
-    """将大小对齐到指定边界"""
-    return (size + alignment - 1) // alignment * alignment
+    """将大小对齐到指定边界（alignment 必须是 2 的幂）"""
+    assert alignment & (alignment - 1) == 0, "alignment must be a power of two"
+    return (size + alignment - 1) & ~(alignment - 1)
 
 
-def pack_file(path: Path, base: Path) -> bytes:
+def pack_metadata(entry: os.DirEntry, is_dir: bool, base_len: int) -> Optional[EntryMeta]:
     """
-    打包单个文件或目录
+    计算单个文件或目录写入条目表所需的元数据
 
     Args:
-        path: 文件/目录的绝对路径
-        base: 基准目录路径，用于计算相对路径
+        entry: 文件/目录对应的目录项
+        is_dir: 是否为目录（否则为普通文件）
+        base_len: 源目录路径（含末尾分隔符）的长度，用于截取相对路径
 
     Returns:
-        打包后的字节数据，包括文件头、文件名、文件数据
+        条目元数据，需要跳过时返回 None
     """
-    # 计算相对路径
-    try:
-        rel_path = path.relative_to(base)
-    except ValueError:
-        print(f"Warning: {path} is not relative to {base}, skipping")
-        return b""
-
     # 跳过隐藏文件和特殊文件
-    if rel_path.name.startswith('.') or rel_path.name in ['Cargo.lock', 'Cargo.toml']:
-        return b""
-
-    name_str = str(rel_path).replace('\\', '/')  # Windows 兼容
-    name_bytes = name_str.encode('utf-8')
-
-    # 确定文件类型和数据
-    if path.is_file():
-        data = path.read_bytes()
-        file_type = FILE_TYPE_FILE
-        mode = 0o644
-    elif path.is_dir():
-        data = b""
-        file_type = FILE_TYPE_DIR
-        mode = 0o755
-    else:
-        # 跳过符号链接等特殊文件
-        return b""
-
-    # 构建文件头 (32字节)
-    header = struct.pack(
-        '<5I3I',  # 小端序，5个uint32 + 3个padding
-        FILE_MAGIC,
-        len(name_bytes),
-        len(data),
-        file_type,
-        mode,
-        0, 0, 0  # padding
-    )
+    if entry.name.startswith('.') or entry.name in EXCLUDED_NAMES:
+        return None
+
+    # 截去源目录前缀得到相对路径，镜像内统一使用 '/' 作为分隔符
+    rel_path = entry.path[base_len:]
+    if os.sep != '/':
+        rel_path = rel_path.replace(os.sep, '/')
+    name_bytes = rel_path.encode('utf-8')
+
+    if is_dir:
+        return EntryMeta(name_bytes, FILE_TYPE_DIR, 0o755, 0)
+
+    # stat 结果由 DirEntry 缓存
+    return EntryMeta(name_bytes, FILE_TYPE_FILE, 0o644, entry.stat(follow_symlinks=False).st_size)
 
-    # 名称对齐到4字节
-    name_aligned = name_bytes + b'\0' * (align_to(len(name_bytes), 4) - len(name_bytes))
+
+def build_metadata(metas: List[EntryMeta]) -> Tuple[array, bytes, int, int]:
+    """
+    构建条目表和名称区，并确定每个文件在数据区中的位置
+
+    条目表作为 uint32 数组按列整体填充，而不是逐个条目打包。
+
+    Args:
+        metas: 按写入顺序排列的条目元数据
+
+    Returns:
+        (条目表, 名称区, 数据区起始偏移, 镜像总大小)
+    """
+    count = len(metas)
+    names = [meta.name for meta in metas]
+    name_lens = [len(name) for name in names]
+    data_lens = [meta.size for meta in metas]
+
+    # 名称对齐到4字节，数据区从块边界开始，数据对齐到块大小
+    names_start = IMG_HDR.size + FILE_HDR.size * count
+    name_offsets = list(accumulate((align_to(n, 4) for n in name_lens), initial=names_start))
+    data_start = align_to(name_offsets[-1], BLOCK_SIZE)
+    data_offsets = list(accumulate((align_to(n, BLOCK_SIZE) for n in data_lens), initial=data_start))
+
+    # 每个条目为 8 个 uint32，第 k 个字段即 table[k::8]；保留字段保持为 0
+    table = array('I', bytes(FILE_HDR.size * count))
+    table[0::8] = array('I', [FILE_MAGIC]) * count
+    table[1::8] = array('I', name_lens)
+    table[2::8] = array('I', data_lens)
+    table[3::8] = array('I', [meta.file_type for meta in metas])
+    table[4::8] = array('I', [meta.mode for meta in metas])
+    table[5::8] = array('I', name_offsets[:-1])
+    table[6::8] = array('I', data_offsets[:-1])
+    if sys.byteorder != 'little':
+        table.byteswap()
+
+    names_blob = b''.join(name + ZEROS[:(-len(name)) & 3] for name in names)
+
+    return table, names_blob, data_start, data_offsets[-1]
+
+
+def load_payload(src_path: str, size: int) -> Optional[bytes]:
+    """
+    预读小文件的数据（在工作线程中执行，不产生输出）
+
+    Args:
+        src_path: 源文件路径
+        size: 文件大小
+
+    Returns:
+        文件数据；超过 PREFETCH_LIMIT 的文件返回 None，留给写入线程流式复制
+
+    Raises:
+        RuntimeError: 文件大小与收集时记录的不一致
+    """
+    if size > PREFETCH_LIMIT:
+        return None
+
+    # 多读一个字节，以便发现在收集之后变大的文件
+    with open(src_path, 'rb', buffering=0) as src:
+        data = src.read(size + 1)
+    if len(data) != size:
+        raise RuntimeError(f"{src_path} changed size while packing")
+    return data
+
+
+def copy_payload(f: BinaryIO, src_path: str, size: int):
+    """
+    将源文件数据复制到镜像的当前位置
+
+    Linux 上通过 os.sendfile 由内核直接复制，数据不经过用户态；
+    其他平台将源文件 mmap 后直接写出，避免在 Python 中读出中间副本。
+
+    Args:
+        f: 已打开的镜像文件
+        src_path: 源文件路径
+        size: 要复制的字节数
+
+    Raises:
+        RuntimeError: 文件大小与收集时记录的不一致
+    """
+    with open(src_path, 'rb', buffering=0) as src:
+        if not USE_SENDFILE:
+            if os.fstat(src.fileno()).st_size != size:
+                raise RuntimeError(f"{src_path} changed size while packing")
+            # mmap 不接受空文件
+            if size > 0:
+                with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if len(mm) != size:
+                        raise RuntimeError(f"{src_path} changed size while packing")
+                    f.write(mm)
+            return
+
+        # 先刷出缓冲区，保证与 sendfile 的写入顺序一致
+        f.flush()
+        offset = f.tell()
+        out_fd, in_fd = f.fileno(), src.fileno()
+        remaining = size
+        while remaining > 0:
+            sent = os.sendfile(out_fd, in_fd, None, remaining)
+            if sent == 0:
+                # 源文件在打包过程中被截断
+                raise RuntimeError(f"{src_path} changed size while packing")
+            remaining -= sent
+        if os.fstat(in_fd).st_size != size:
+            raise RuntimeError(f"{src_path} changed size while packing")
+
+        # sendfile 绕过了文件对象，需要同步其写入位置
+        f.seek(offset + size)
+
+
+def write_payload(f: BinaryIO, src_path: str, size: int, data: Optional[bytes]):
+    """
+    将单个文件的数据写入数据区的当前位置
+
+    未预读的文件数据以流的方式从源文件复制到镜像中，不会整体读入内存。
+
+    Args:
+        f: 已打开的镜像文件
+        src_path: 源文件路径
+        size: 文件大小
+        data: 预读的文件数据，为 None 时从源文件流式复制
+    """
+    if data is not None:
+        f.write(data)
+    else:
+        copy_payload(f, src_path, size)
 
     # 数据对齐到块大小
-    data_aligned = data + b'\0' * (align_to(len(data), BLOCK_SIZE) - len(data))
+    f.write(ZEROS[:(-size) & (BLOCK_SIZE - 1)])
+
+
+def walk(root: str) -> Iterator[Entry]:
+    """
+    深度优先遍历目录树，每个目录只调用一次 scandir
+
+    条目类型直接取自 scandir 的结果，无需额外的 stat 调用；
+    只在每个目录内部按名称排序，目录总是先于其内容产出。
+    PRUNE_DIRS 中的目录连同其内容一起跳过，不会被读取。
+
+    Args:
+        root: 当前遍历的目录路径
 
-    return header + name_aligned + data_aligned
+    Yields:
+        (目录项, 是否为目录)
+    """
+    with os.scandir(root) as it:
+        entries = sorted(it, key=attrgetter('name'))
+
+    for entry in entries:
+        # 条目类型只判断一次，随结果一起传给下游
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if is_dir and entry.name in PRUNE_DIRS:
+            continue
+
+        yield entry, is_dir
+        if is_dir:
+            yield from walk(entry.path)
 
 
-def collect_files(src_dir: Path) -> List[Path]:
+def collect_files(src_dir: Path) -> List[Entry]:
     """
     递归收集目录中的所有文件和目录
 
@@ -98,31 +280,44 @@ def collect_files(src_dir: Path) -> List[Path]:
         src_dir: 源目录路径
 
     Returns:
-        文件路径列表（已排序）
+        (目录项, 是否为目录) 列表，按写入镜像的顺序排列，只包含目录和普通文件
     """
     if not src_dir.exists():
         return []
 
     items = []
-
-    # 首先添加所有目录（深度优先）
-    for item in sorted(src_dir.rglob('*')):
-        if item.is_dir():
+    for item in walk(os.fspath(src_dir)):
+        entry, is_dir = item
+        if is_dir:
             items.append(item)
-
-    # 然后添加所有文件
-    for item in sorted(src_dir.rglob('*')):
-        if item.is_file():
+        elif entry.is_file(follow_symlinks=False):
             # 跳过不需要的文件
-            if item.suffix in ['.d', '.o', '.a', '.rlib']:
-                continue
-            if item.name in ['Cargo.lock', '.gitignore']:
+            if entry.name in SKIP_NAMES or os.path.splitext(entry.name)[1] in SKIP_SUFFIXES:
                 continue
             items.append(item)
+        # 跳过符号链接等特殊文件
 
     return items
 
 
+def preallocate(f: BinaryIO, size: int):
+    """
+    为镜像文件预先分配磁盘空间，便于文件系统分配连续的区段
+
+    不支持 posix_fallocate 的平台或文件系统上静默跳过。
+
+    Args:
+        f: 已打开的镜像文件
+        size: 预分配的字节数
+    """
+    if not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError:
+        pass
+
+
 def make_simple_fs(src_dir: Path, output: Path, verbose: bool = False) -> Tuple[int, int]:
     """
     生成 simple_fs 镜像
@@ -138,8 +333,7 @@ def make_simple_fs(src_dir: Path, output: Path, verbose: bool = False) -> Tuple[
     if not src_dir.exists():
         print(f"Warning: Source directory {src_dir} does not exist, creating empty image")
         # 创建空镜像
-        header = MAGIC + struct.pack('<II', 0, 0)
-        header += b'\0' * (16 - len(header))
+        header = IMG_HDR.pack(MAGIC, 0, FORMAT_VERSION)
         output.write_bytes(header)
         return 0, len(header)
 
@@ -150,39 +344,64 @@ def make_simple_fs(src_dir: Path, output: Path, verbose: bool = False) -> Tuple[
         print(f"Collecting files from {src_dir}...")
         print(f"Found {len(files)} items")
 
-    # 打包所有文件
-    packed_files = []
-    for item in files:
-        packed = pack_file(item, src_dir)
-        if packed:
-            packed_files.append(packed)
-            if verbose:
-                rel_path = item.relative_to(src_dir)
-                file_type = "DIR " if item.is_dir() else "FILE"
-                size = 0 if item.is_dir() else item.stat().st_size
-                print(f"  [{file_type}] {rel_path} ({size} bytes)")
-
-    # 构建镜像头 (16字节)
-    header = MAGIC + struct.pack('<II', len(packed_files), 0)
-    header += b'\0' * (16 - len(header))
+    # 条目路径均以源目录路径为前缀，相对路径直接按长度截取
+    base_len = len(os.fspath(src_dir).rstrip(os.sep) + os.sep)
+
+    # 第一阶段：确定所有条目的元数据，构建条目表和名称区
+    entries = []
+    metas = []
+    for entry, is_dir in files:
+        meta = pack_metadata(entry, is_dir, base_len)
+        if meta is None:
+            continue
+        entries.append(entry)
+        metas.append(meta)
+        if verbose:
+            # 直接使用元数据中已有的大小，不再重复 stat
+            file_type = "DIR " if is_dir else "FILE"
+            print(f"  [{file_type}] {entry.path[base_len:]} ({meta.size} bytes)")
+
+    table, names, data_start, image_size = build_metadata(metas)
 
     # 写入镜像
     output.parent.mkdir(parents=True, exist_ok=True)
-    with open(output, 'wb') as f:
-        f.write(header)
-        for file_data in packed_files:
-            f.write(file_data)
-
-        # 填充镜像到块边界，确保镜像大小是 BLOCK_SIZE 的整数倍
-        current_size = f.tell()
-        aligned_size = align_to(current_size, BLOCK_SIZE)
-        padding = aligned_size - current_size
-        if padding > 0:
-            f.write(b'\0' * padding)
+    with open(output, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+        preallocate(f, image_size)
+
+        # 镜像头、条目表、名称区及其到数据区的填充，由写缓冲区合并写出
+        f.write(IMG_HDR.pack(MAGIC, len(metas), FORMAT_VERSION))
+        f.write(table)
+        f.write(names)
+        f.write(ZEROS[:data_start - f.tell()])
+
+        # 第二阶段：依次写入文件数据；小文件由线程池并发预读，按顺序写入以保持布局确定
+        payloads = [
+            (entry.path, meta.size)
+            for entry, meta in zip(entries, metas)
+            if meta.file_type == FILE_TYPE_FILE
+        ]
+        data_offset = data_start
+        workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(payloads), PREFETCH_BATCH):
+                batch = payloads[start:start + PREFETCH_BATCH]
+                futures = [pool.submit(load_payload, path, size) for path, size in batch]
+                for (path, size), future in zip(batch, futures):
+                    write_payload(f, path, size, future.result())
+
+                    # 数据必须恰好落在条目表记录的位置，否则后续条目都会错位
+                    data_offset += align_to(size, BLOCK_SIZE)
+                    if f.tell() != data_offset:
+                        raise RuntimeError(
+                            f"{path}: expected image offset {data_offset}, got {f.tell()}"
+                        )
+
+        # 将镜像大小截断到块边界，同时去掉预分配但未使用的部分
+        f.truncate(align_to(f.tell(), BLOCK_SIZE))
 
     total_size = output.stat().st_size
 
-    return len(packed_files), total_size
+    return len(metas), total_size
 
 
 def inspect_simple_fs(img_path: Path):
@@ -194,32 +413,35 @@ def inspect_simple_fs(img_path: Path):
     """
     with open(img_path, 'rb') as f:
         # 读取头部
-        magic = f.read(8)
-        if magic != MAGIC:
-            print(f"Error: Invalid magic: {magic}")
+        header = f.read(IMG_HDR.size)
+        # 文件过短时同样按魔数错误处理，不让 struct.error 抛出
+        if header[:8] != MAGIC:
+            print(f"Error: Invalid magic: {header[:8]}")
+            return
+        if len(header) < IMG_HDR.size:
+            print(f"Error: Truncated header: {len(header)} bytes")
+            return
+        magic, file_count, version = IMG_HDR.unpack(header)
+        if version != FORMAT_VERSION:
+            print(f"Error: Unsupported image version: {version} (expected {FORMAT_VERSION})")
             return
-
-        file_count = struct.unpack('<I', f.read(4))[0]
-        f.read(4)  # reserved
 
         print(f"Simple_fs Image: {img_path}")
         print(f"  Total files: {file_count}")
         print()
 
-        # 读取每个文件
+        # 读取条目表，按名称偏移读取每个文件名
+        table = f.read(FILE_HDR.size * file_count)
         for i in range(file_count):
-            header = f.read(32)
-            magic, name_len, data_len, file_type, mode = struct.unpack('<5I', header[:20])
+            magic, name_len, data_len, file_type, mode, name_offset, _, _ = \
+                FILE_HDR.unpack_from(table, i * FILE_HDR.size)
 
             if magic != FILE_MAGIC:
                 print(f"Error: Invalid file magic at entry {i}")
                 break
 
-            name_aligned = align_to(name_len, 4)
-            data_aligned = align_to(data_len, BLOCK_SIZE)
-
-            name = f.read(name_aligned)[:name_len].decode('utf-8')
-            f.seek(data_aligned, 1)  # 跳过数据
+            f.seek(name_offset)
+            name = f.read(name_len).decode('utf-8')
 
             type_str = "FILE" if file_type == FILE_TYPE_FILE else "DIR "
             print(f"  [{type_str}] {name}")
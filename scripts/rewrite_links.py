@@ -6,19 +6,28 @@ mdBook 链接重写脚本：将 /os/src/... 路径转换为 GitHub URL
   python3 scripts/rewrite_links.py document/
 """
 
+import mmap
+import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # GitHub 仓库配置
 GITHUB_REPO = "https://github.com/comix-kernel/comix"
 GITHUB_BRANCH = "main"
 
+# 转换后链接的固定前缀；以字节串形式处理文件内容，省去 UTF-8 解码/编码
+GITHUB_URL_PREFIX = f"{GITHUB_REPO}/blob/{GITHUB_BRANCH}/os/src/".encode()
+
 # 链接模式：支持以下格式
 # 1. [text](/os/src/path/file.rs)
 # 2. [text](/os/src/path/file.rs:line)
 # 3. [text](/os/src/path/file.rs:start-end)
-LINK_PATTERN = r'\[([^\]]+)\]\(/os/src/([^\)]+)\)'
+LINK_PATTERN = rb'\[([^\]]+)\]\(/os/src/([^\)]+)\)'
+LINK_RE = re.compile(LINK_PATTERN)
+# 所有待转换链接都包含的子串，用于快速排除无需处理的文件
+LINK_NEEDLE = b'/os/src/'
 
 
 def convert_link(match):
@@ -27,40 +36,40 @@ def convert_link(match):
     path = match.group(2)
 
     # 处理行号：/os/src/mm/address.rs:12 -> /os/src/mm/address.rs + #L12
-    line_anchor = ""
-    if ":" in path:
-        file_path, line_spec = path.rsplit(":", 1)
-        # 支持单行 (L12) 和行范围 (L12-L34)
-        if "-" in line_spec:
-            start_line, end_line = line_spec.split("-")
-            line_anchor = f"#L{start_line}-L{end_line}"
-        else:
-            line_anchor = f"#L{line_spec}"
+    # 支持单行 (L12) 和行范围 (L12-L34)
+    file_path, sep, line_spec = path.rpartition(b":")
+    if sep:
+        line_anchor = b"#L" + line_spec.replace(b"-", b"-L")
     else:
         file_path = path
+        line_anchor = b""
 
     # 构造 GitHub URL
-    github_url = f"{GITHUB_REPO}/blob/{GITHUB_BRANCH}/os/src/{file_path}{line_anchor}"
-
-    return f"[{text}]({github_url})"
+    return b"[%s](%s%s%s)" % (text, GITHUB_URL_PREFIX, file_path, line_anchor)
 
 
 def process_file(file_path):
     """处理单个 Markdown 文件"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    with open(file_path, 'rb') as f:
+        # 空文件无法 mmap，且必然没有链接
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0, False
 
-    # 计数：用于验证处理结果
-    original_count = len(re.findall(LINK_PATTERN, content))
+        # 先用 mmap 查找子串，大多数文件不含链接，无需读入和匹配
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(LINK_NEEDLE) == -1:
+                return 0, False
+
+        content = f.read()
 
-    # 替换链接
-    new_content = re.sub(LINK_PATTERN, convert_link, content)
+    # 替换链接，同时得到替换次数
+    new_content, count = LINK_RE.subn(convert_link, content)
 
-    # 检查是否有变化
-    if content != new_content:
-        with open(file_path, 'w', encoding='utf-8') as f:
+    # 没有匹配的链接时无需比较和写回
+    if count and content != new_content:
+        with open(file_path, 'wb') as f:
             f.write(new_content)
-        return original_count, True
+        return count, True
 
     return 0, False
 
@@ -79,13 +88,15 @@ def main():
     total_links = 0
     modified_files = 0
 
-    # 处理所有 Markdown 文件
-    for md_file in doc_dir.rglob("*.md"):
-        link_count, was_modified = process_file(md_file)
-        if was_modified:
-            total_links += link_count
-            modified_files += 1
-            print(f"✓ {md_file.relative_to(doc_dir)} - {link_count} 个链接")
+    # 处理所有 Markdown 文件：各文件相互独立，正则匹配受 GIL 限制，故使用多进程
+    md_files = list(doc_dir.rglob("*.md"))
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(process_file, md_files, chunksize=8)
+        for md_file, (link_count, was_modified) in zip(md_files, results):
+            if was_modified:
+                total_links += link_count
+                modified_files += 1
+                print(f"✓ {md_file.relative_to(doc_dir)} - {link_count} 个链接")
 
     print(f"\n总结: 修改 {modified_files} 个文件, 转换 {total_links} 个链接")
 